@@ -2,10 +2,23 @@
 Main Streamlit application for Portfolio Intelligence Pro
 """
 
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from pathlib import Path
 import streamlit as st
-import robin_stocks.robinhood as rs
+import streamlit.components.v1 as components
 import config
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor
 import plotly.graph_objects as go
 from stock_analyzer import StockAnalyzer
 from ui_components import (
@@ -15,618 +28,919 @@ from ui_components import (
     render_buy_opportunities
 )
 
+# Login errors that mean Robinhood wants a multi-factor code
+_MFA_RE = re.compile(r"mfa|two[- ]?factor|2fa|verification|authenticator|sms", re.I)
+# A well-formed MFA code: exactly six digits
+_MFA_CODE = re.compile(r"[0-9]{6}").fullmatch
+# Login errors caused by the network rather than the credentials
+_NET_RE = re.compile(r"timeout|connection", re.I)
 
-def main():
-    """Main Streamlit application"""
-    
-    # Page configuration MUST be called first, before any other Streamlit commands
-    st.set_page_config(
-        page_title=config.PAGE_CONFIG['page_title'],
-        page_icon=config.PAGE_CONFIG['page_icon'],
-        layout=config.PAGE_CONFIG['layout'],
-        initial_sidebar_state="expanded"
-    )
-    
-    # Custom CSS for modern styling
-    st.markdown("""
-    <style>
-    /* Modern styling for the entire app */
-    .main {
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-        padding: 1rem;
-    }
-    
-    /* Custom button styling */
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+
+_APP_CSS_PATH = Path(__file__).parent / "static" / "style.css"
+
+# App header banner
+_HEADER_HTML = """
+<div style="
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    padding: 2rem;
+    border-radius: 20px;
+    margin-bottom: 2rem;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+    text-align: center;
+    ">
+    <h1 style="
         color: white;
-        border: none;
-        border-radius: 25px;
-        padding: 0.5rem 1.5rem;
-        font-weight: 600;
-        box-shadow: 0 4px 15px rgba(102,126,234,0.3);
-        transition: all 0.3s ease;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(102,126,234,0.4);
-    }
-    
-    /* Custom metric styling */
-    .stMetric {
-        background: white;
-        padding: 1rem;
-        border-radius: 15px;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Custom dataframe styling */
-    .stDataFrame {
-        background: white;
-        border-radius: 15px;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Custom expander styling */
-    .streamlit-expanderHeader {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        margin: 0;
+        font-size: 3rem;
+        font-weight: 700;
+        text-shadow: 0 2px 4px rgba(0,0,0,0.3);
+    ">🚀 Portfolio Intelligence Pro</h1>
+    <p style="
+        color: rgba(255,255,255,0.9);
+        margin: 0.5rem 0 0 0;
+        font-size: 1.3rem;
+        font-weight: 300;
+    ">Advanced Portfolio Analysis & Trading Intelligence</p>
+</div>
+"""
+
+# App footer banner
+_FOOTER_HTML = """
+<div style="
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    padding: 1.5rem;
+    border-radius: 15px;
+    text-align: center;
+    margin-top: 2rem;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+">
+    <p style="margin: 0; font-size: 1rem; opacity: 0.9;">
+        🚀 Portfolio Intelligence Pro - Advanced Portfolio Analysis & Trading Intelligence
+    </p>
+    <p style="margin: 0.5rem 0 0 0; font-size: 0.9rem; opacity: 0.8;">
+        Built with Streamlit • Powered by Robinhood API • Modern UI Design
+    </p>
+</div>
+"""
+
+# Sidebar section cards
+_CONFIG_CARD_HTML = """
+<div style="
+    background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
+    padding: 1.5rem;
+    border-radius: 15px;
+    margin-bottom: 1rem;
+    box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+">
+    <h3 style="
         color: white;
-        border-radius: 10px;
+        margin: 0 0 1rem 0;
+        text-align: center;
         font-weight: 600;
-    }
-    
-    /* Custom sidebar styling */
-    .css-1d391kg {
-        background: linear-gradient(180deg, #2c3e50 0%, #34495e 100%);
-    }
-    
-    /* Custom header styling */
-    .css-1v0mbdj {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-    }
-    
-    /* Custom tab styling */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        background: white;
-        border-radius: 10px;
-        padding: 0.5rem 1rem;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    ">⚙️ Configuration</h3>
+</div>
+"""
+_LOGIN_CARD_HTML = """
+<div style="
+    background: linear-gradient(135deg, #00b894 0%, #00cec9 100%);
+    padding: 1.5rem;
+    border-radius: 15px;
+    margin-bottom: 1rem;
+    box-shadow: 0 4px 20px rgba(0,184,148,0.3);
+">
+    <h3 style="
         color: white;
-        box-shadow: 0 4px 15px rgba(102,126,234,0.3);
-    }
-    
-    /* Custom input styling */
-    .stTextInput > div > div > input {
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-    }
-    
-    .stNumberInput > div > div > input {
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-    }
-    
-    /* Custom selectbox styling */
-    .stSelectbox > div > div {
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-    }
-    
-    /* Custom slider styling */
-    .stSlider > div > div > div > div {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    }
-    
-    /* Custom checkbox styling */
-    .stCheckbox > div > label {
-        background: white;
-        padding: 0.5rem 1rem;
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-    }
-    
-    /* Custom radio styling */
-    .stRadio > div > label {
-        background: white;
-        padding: 0.5rem 1rem;
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-    }
-    
-    /* Custom file uploader styling */
-    .stFileUploader > div > div {
-        background: white;
-        border-radius: 15px;
-        border: 2px dashed #667eea;
-        padding: 2rem;
+        margin: 0 0 1rem 0;
         text-align: center;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-    }
-    
-    /* Custom success/error message styling */
-    .stAlert {
-        border-radius: 15px;
-        border: none;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-    }
-    
-    /* Custom info message styling */
-    .stInfo {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        color: white;
-        border-radius: 15px;
-        border: none;
-        box-shadow: 0 4px 20px rgba(79,172,254,0.3);
-    }
-    
-    /* Custom warning message styling */
-    .stWarning {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        color: white;
-        border-radius: 15px;
-        border: none;
-        box-shadow: 0 4px 20px rgba(240,147,251,0.3);
-    }
-    
-    /* Custom error message styling */
-    .stError {
-        background: linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%);
-        color: white;
-        border-radius: 15px;
-        border: none;
-        box-shadow: 0 4px 20px rgba(255,107,107,0.3);
-    }
-    
-    /* Custom success message styling */
-    .stSuccess {
-        background: linear-gradient(135deg, #00b894 0%, #00cec9 100%);
-        color: white;
-        border-radius: 15px;
-        border: none;
-        box-shadow: 0 4px 20px rgba(0,184,148,0.3);
-    }
-    
-    /* Custom plotly chart styling */
-    .js-plotly-plot {
-        border-radius: 15px;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Custom table styling */
-    .stTable {
-        background: white;
-        border-radius: 15px;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Custom code block styling */
-    .stCodeBlock {
-        background: #2c3e50;
-        border-radius: 15px;
-        border: 1px solid #34495e;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-    }
-    
-    /* Custom markdown styling */
-    .stMarkdown {
-        background: white;
-        padding: 1rem;
-        border-radius: 15px;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        border: 1px solid #e9ecef;
-        margin: 1rem 0;
-    }
-    
-    /* Custom divider styling */
-    .stDivider {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        height: 3px;
-        border-radius: 2px;
-        margin: 2rem 0;
-    }
-    
-    /* Custom progress bar styling */
-    .stProgress > div > div > div {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 10px;
-    }
-    
-    /* Custom spinner styling */
-    .stSpinner > div > div {
-        border: 3px solid #f3f3f3;
-        border-top: 3px solid #667eea;
-        border-radius: 50%;
-        width: 30px;
-        height: 30px;
-        animation: spin 1s linear infinite;
-    }
-    
-    @keyframes spin {
-        0% { transform: rotate(0deg); }
-        100% { transform: rotate(360deg); }
-    }
-    
-    /* Custom tooltip styling */
-    .stTooltip {
-        background: #2c3e50;
-        color: white;
-        border-radius: 10px;
-        padding: 0.5rem 1rem;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.2);
-    }
-    
-    /* Custom sidebar navigation styling */
-    .css-1d391kg .css-1lcbmhc {
-        background: linear-gradient(180deg, #2c3e50 0%, #34495e 100%);
-        border-radius: 15px;
-        margin: 0.5rem;
-        padding: 1rem;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-    }
-    
-    /* Custom main content area styling */
-    .main .block-container {
-        background: white;
-        border-radius: 20px;
-        padding: 2rem;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-        border: 1px solid #e9ecef;
-        margin: 1rem 0;
-    }
-    
-    /* Custom footer styling */
-    .css-1v0mbdj + div {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        font-weight: 600;
+    ">🔐 Robinhood Login</h3>
+</div>
+"""
+_MFA_HELP_HTML = """
+<div style="
+    background: rgba(255,255,255,0.1);
+    padding: 1rem;
+    border-radius: 10px;
+    margin-top: 1rem;
+    border-left: 4px solid #ffc107;
+">
+    <h4 style="margin: 0 0 0.5rem 0; color: white;">🔐 Multi-Factor Authentication Required</h4>
+    <p style="margin: 0; color: rgba(255,255,255,0.9); font-size: 0.9rem;">
+        Robinhood requires MFA for security. Enter the 6-digit code from your authenticator app or SMS.
+    </p>
+</div>
+"""
+_PRIVACY_CARD_HTML = """
+<div style="
+    background: linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%);
+    padding: 1.5rem;
+    border-radius: 15px;
+    margin-bottom: 1rem;
+    box-shadow: 0 4px 20px rgba(255,107,107,0.3);
+">
+    <h3 style="
         color: white;
-        padding: 1rem;
-        border-radius: 15px;
+        margin: 0 0 1rem 0;
         text-align: center;
-        margin-top: 2rem;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+        font-weight: 600;
+    ">🔒 Privacy Settings</h3>
+</div>
+"""
+
+# Privacy status banner, pre-rendered for both states
+_PRIVACY_BANNER_TEMPLATE = """
+<div style="
+    background: rgba(255,255,255,0.2);
+    padding: 0.5rem;
+    border-radius: 10px;
+    text-align: center;
+    margin-top: 0.5rem;
+">
+    <p style="margin: 0; color: white; font-size: 0.9rem; font-weight: 600;">
+        {status}
+    </p>
+</div>
+"""
+_PRIVACY_ON_HTML = _PRIVACY_BANNER_TEMPLATE.format(status="🔒 Privacy Mode Active - All values hidden as ***")
+_PRIVACY_OFF_HTML = _PRIVACY_BANNER_TEMPLATE.format(status="👁️ All Values Visible")
+
+# Portfolio tab section heading
+_OVERVIEW_HEADER_HTML = """
+<div style="margin-bottom: 2rem;">
+    <h2 style="
+        color: #2c3e50;
+        margin: 0 0 1rem 0;
+        font-weight: 600;
+        display: flex;
+        align-items: center;
+        gap: 0.5rem;
+    ">
+        <span style="
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+            background-clip: text;
+        ">📊</span>
+        Account Overview
+    </h2>
+</div>
+"""
+
+# Account overview card; filled in with str.format
+_ACCOUNT_CARD_TEMPLATE = """
+<div class="overview-card" style="background: {background};">
+    <h4>{label}</h4>
+    <h3>{value}</h3>
+</div>
+"""
+
+# Best/worst performer card; filled in with str.format
+_PERFORMER_CARD_TEMPLATE = """
+<div style="
+    background: {background};
+    padding: 1.5rem;
+    border-radius: 15px;
+    text-align: center;
+    color: white;
+    box-shadow: 0 4px 20px {shadow};
+">
+    <h4 style="margin: 0 0 0.5rem 0;">{title}</h4>
+    <h3 style="margin: 0.5rem 0;">{symbol}</h3>
+    <p style="margin: 0; font-size: 1.2rem; font-weight: bold;">{change}</p>
+</div>
+"""
+
+
+@st.cache_resource
+def _robinhood():
+    """Import robin_stocks on first use so sessions that never log in skip loading it.
+
+    Its shared requests session gets a larger keep-alive pool (enough for the lookup
+    workers) and retries idempotent GETs on 429s and transient 5xx responses.
+    """
+    import robin_stocks.robinhood as rs
+    from robin_stocks.robinhood.globals import SESSION
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset({"GET"}))
+    SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    return rs
+
+
+class _RateLimiter:
+    """Token bucket shared by the per-request Robinhood account and quote calls, so refresh bursts can't run into its rate limits"""
+    
+    def __init__(self, rate=1.0, capacity=30):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Take one token, sleeping until the bucket refills if it is empty"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+@st.cache_resource
+def _rate_limiter():
+    """One bucket per process, shared by every session's Robinhood calls"""
+    return _RateLimiter()
+
+
+def _throttled(func):
+    """Run a Robinhood fetch only after taking a token; goes under the cache decorator so cache hits stay free"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _rate_limiter().acquire()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _single_flight(func):
+    """Share one in-flight call between concurrent callers with the same arguments.
+
+    st.cache_data only helps once a value is stored; this stops overlapping reruns and
+    sessions from all missing the cache together and sending the same request.
+    """
+    inflight = {}
+    lock = threading.Lock()
+    
+    @functools.wraps(func)
+    def wrapper(*args):
+        with lock:
+            future = inflight.get(args)
+            leader = future is None
+            if leader:
+                future = inflight[args] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with lock:
+                del inflight[args]
+    return wrapper
+
+
+@st.cache_resource
+def _app_css():
+    """Read the app stylesheet from disk once per process"""
+    return _APP_CSS_PATH.read_text(encoding="utf-8")
+
+
+def _inject_css_once():
+    """Send the stylesheet to the browser once per session.
+
+    An element that is skipped on a rerun is removed from the page, so instead of
+    guarding st.markdown the CSS is copied into the parent document's <head>,
+    which outlives reruns for as long as the page (and its session) stays open.
+    """
+    if st.session_state.get("_css_done"):
+        return
+    components.html(f"""
+    <script>
+    const doc = window.parent.document;
+    if (!doc.getElementById("pip-app-css")) {{
+        const style = doc.createElement("style");
+        style.id = "pip-app-css";
+        style.textContent = {json.dumps(_app_css())};
+        doc.head.appendChild(style);
+    }}
+    </script>
+    """, height=0)
+    st.session_state["_css_done"] = True
+
+
+def _set_mfa_required(required):
+    """Keep the MFA flag in the URL so it survives reloads and toggles without an extra rerun"""
+    if required:
+        st.query_params["mfa"] = "1"
+    else:
+        st.query_params.pop("mfa", None)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+@_throttled
+def _cached_account():
+    """Robinhood account profile, cached briefly so reruns skip the round-trip"""
+    return _robinhood().load_account_profile()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+@_throttled
+def _cached_portfolio():
+    """Robinhood portfolio profile, cached briefly so reruns skip the round-trip"""
+    return _robinhood().load_portfolio_profile()
+
+
+def _clear_account_cache():
+    """Drop cached Robinhood profiles when the logged-in session changes"""
+    _cached_account.clear()
+    _cached_portfolio.clear()
+    _load_positions.clear()
+
+
+@st.cache_resource
+def _instrument_cache():
+    """Instrument metadata by URL, shared by the process; it effectively never changes, so entries never expire"""
+    return {}
+
+
+def _safe_instrument(rs, url, attempts=3):
+    """Look up a Robinhood instrument, retrying transient failures; None if it never succeeds.
+
+    Runs on lookup pool threads, so it only touches the robin_stocks handle it is given.
+    """
+    for attempt in range(attempts):
+        try:
+            instrument = rs.get_instrument_by_url(url)
+            if instrument:
+                return instrument
+        except requests.RequestException:
+            pass
+        if attempt < attempts - 1:
+            time.sleep(0.2 * 2 ** attempt)
+    return None
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+@_single_flight
+@_throttled
+def _latest_prices(symbols):
+    """Latest trade price per symbol from a single bulk quote request, reused for a few seconds"""
+    quotes = _robinhood().get_quotes(list(symbols)) or []
+    return {
+        quote['symbol']: quote.get('last_extended_hours_trade_price') or quote.get('last_trade_price')
+        for quote in quotes if quote
     }
-    
-    /* Responsive design improvements */
-    @media (max-width: 768px) {
-        .main .block-container {
-            padding: 1rem;
-            margin: 0.5rem 0;
-        }
+
+
+@st.cache_resource
+def _lookup_pool():
+    """Process-wide pool for Robinhood lookups; 8 workers overlaps latency without tripping rate limits"""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="rh-lookup")
+
+
+def _resolve_positions(positions):
+    """Resolve open positions into a DataFrame of symbol, quantity and average cost.
+
+    Uncached instruments are looked up concurrently instead of one round-trip per position.
+    """
+    # Closed positions can still come back with quantity 0; drop them before any lookups
+    active = [p for p in positions if p and float(p.get('quantity') or 0) > 0]
+    
+    # Cache checks and the robin_stocks handle stay on the script thread; workers only do the raw lookups
+    cache = _instrument_cache()
+    rs = _robinhood()
+    missing = list({p['instrument'] for p in active} - cache.keys())
+    for url, instrument in zip(missing, _lookup_pool().map(functools.partial(_safe_instrument, rs), missing)):
+        if instrument:
+            cache[url] = instrument  # Failed lookups stay out of the cache so the next load retries them
+    instruments = [cache.get(p['instrument']) for p in active]
+    
+    resolved = [(position, instrument['symbol']) for position, instrument in zip(active, instruments) if instrument]
+    # Name unresolved positions by their instrument URL, which is all there is to go on without the lookup
+    dropped = [f"instrument {position['instrument']}"
+               for position, instrument in zip(active, instruments) if not instrument]
+    
+    rows = []
+    for position, symbol in resolved:
+        try:
+            rows.append((symbol, float(position['quantity']), float(position['average_buy_price'])))
+        except (KeyError, TypeError, ValueError):
+            dropped.append(symbol)  # Unparseable fields for this position
+    
+    resolved_positions = pd.DataFrame(rows, columns=['symbol', 'quantity', 'avg_cost'])
+    resolved_positions.attrs['dropped'] = dropped
+    return resolved_positions
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+@_single_flight
+@_throttled
+def _load_positions():
+    """Open positions with their symbols resolved; quotes are merged in separately so they can refresh faster"""
+    return _resolve_positions(_robinhood().get_open_stock_positions() or [])
+
+
+def _load_holdings():
+    """Cached positions priced with the latest (5-second) quotes, as one holdings frame with P&L columns"""
+    positions = _load_positions()
+    prices = _latest_prices(tuple(sorted(set(positions['symbol'])))) if not positions.empty else {}
+    
+    holdings = positions.assign(price=pd.to_numeric(positions['symbol'].map(prices), errors='coerce'))
+    unpriced = holdings['price'].isna()
+    holdings = holdings[~unpriced].reset_index(drop=True)
+    holdings['value'] = holdings['quantity'] * holdings['price']
+    holdings['cost'] = holdings['quantity'] * holdings['avg_cost']
+    holdings['pnl'] = holdings['value'] - holdings['cost']
+    holdings['pnl_pct'] = (holdings['pnl'] / holdings['cost'].where(holdings['cost'] > 0) * 100).fillna(0)
+    # Positions that never resolved, plus any the quote request had no price for
+    holdings.attrs['dropped'] = positions.attrs.get('dropped', []) + positions.loc[unpriced, 'symbol'].tolist()
+    return holdings
+
+
+def _refresh_holdings():
+    """Refresh prices button callback: drop cached quotes and holdings"""
+    _latest_prices.clear()
+    _load_positions.clear()
+
+
+@st.cache_resource
+def _login_pool():
+    """Worker threads that run Robinhood logins off the script thread"""
+    return ThreadPoolExecutor(max_workers=4)
+
+
+def _session_pickle(username):
+    """Per-user robin_stocks token pickle name and path, so accounts never share a stored session"""
+    name = hashlib.sha256(username.encode()).hexdigest()[:16]
+    return name, Path.home() / ".tokens" / f"robinhood{name}.pickle"
+
+
+def _robinhood_login(rs, username, password, mfa_code=None):
+    """Log in to Robinhood; a stored token for this user short-circuits the OAuth (and MFA) handshake.
+
+    Runs on a login pool thread, so it only uses the robin_stocks handle it is given.
+    """
+    pickle_name, _ = _session_pickle(username)
+    rs.login(username, password, expiresIn=86400, store_session=True,
+             mfa_code=mfa_code, pickle_name=pickle_name)
+
+
+@st.fragment(run_every=0.5)
+def _login_status():
+    """Poll the background login and finish it once the future resolves"""
+    future = st.session_state.get('login_future')
+    if future is None:
+        return
+    if not future.done():
+        st.info("🔐 Logging in...")
+        return
+    
+    del st.session_state['login_future']
+    try:
+        future.result()
+    except Exception as login_error:
+        error_msg = str(login_error)
         
-        .stButton > button {
-            width: 100%;
-            margin: 0.5rem 0;
-        }
+        # Check if MFA is required
+        if _MFA_RE.search(error_msg):
+            _set_mfa_required(True)
+            notices = [("warning", "⚠️ MFA code required. Please enter your MFA code above.")]
+        elif _NET_RE.search(error_msg):
+            notices = [("error", "⏱️ Login timeout. Please check your internet connection and try again.")]
+        else:
+            # Other login error
+            notices = [
+                ("error", f"❌ Login failed: {login_error}"),
+                ("info", "💡 Try using your Robinhood app to approve the login if prompted.")
+            ]
+    else:
+        st.session_state['logged_in'] = True
+        st.session_state['last_error'] = ""
+        _clear_account_cache()
+        _set_mfa_required(False)
+        notices = [("success", "✅ Login successful!")]
+    
+    st.session_state['login_notices'] = notices
+    st.rerun()
+
+
+def _on_login():
+    """Login form callback: start a background login from the submitted values"""
+    if st.session_state.get('logged_in'):
+        st.session_state['login_notices'] = [("success", "✅ Already logged in!")]
+        return
+    
+    username = st.session_state.get('username')
+    password = st.session_state.get('password')
+    if not (username and password):
+        st.session_state['login_notices'] = [("warning", "⚠️ Please enter both username and password.")]
+        return
+    
+    mfa_code = st.session_state.get('mfa_code') if st.query_params.get("mfa") == "1" else None
+    mfa_code = (mfa_code or "").strip() or None  # A blank field logs in without a code, as before
+    if mfa_code is not None and not _MFA_CODE(mfa_code):
+        st.session_state['login_notices'] = [("error", "❌ MFA code must be exactly 6 digits.")]
+        return
+    st.session_state['login_future'] = _login_pool().submit(_robinhood_login, _robinhood(), username, password, mfa_code)
+
+
+def _on_logout():
+    """Logout button callback"""
+    try:
+        _robinhood().logout()
+    except Exception:
+        pass  # Ignore logout errors
+    if st.session_state.get('username'):
+        _session_pickle(st.session_state['username'])[1].unlink(missing_ok=True)
+    st.session_state['logged_in'] = False
+    _clear_account_cache()
+    _set_mfa_required(False)
+    st.session_state['login_notices'] = [("success", "✅ Logged out successfully!")]
+
+
+def _on_privacy_toggle():
+    """Privacy checkbox callback"""
+    st.session_state['privacy_mode'] = st.session_state['sidebar_privacy_toggle']
+
+
+def _first_float(source, keys, default=0.0):
+    """First of ``keys`` in a Robinhood profile that is present and parses as a number (zero included), else ``default``"""
+    if not isinstance(source, dict):
+        return default
+    for key in keys:
+        value = source.get(key)
+        if value is None or value == "":
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return default
+
+
+@st.cache_resource
+def get_analyzer():
+    """Create the StockAnalyzer once per server process and share it across reruns"""
+    return StockAnalyzer()
+
+
+@st.fragment
+def _tab_market(analyzer, drop_threshold):
+    """Market Overview tab, rerun on its own when its widgets change"""
+    render_market_overview(analyzer, drop_threshold)
+
+
+@st.fragment
+def _tab_portfolio(is_logged_in, privacy_mode):
+    """Portfolio Analysis tab backed by the Robinhood session"""
+    if is_logged_in:
+        # Dollar formatter picked once, so privacy mode isn't re-checked for every value
+        money = (lambda value: "***") if privacy_mode else (lambda value: f"${value:,.0f}")
         
-        .stTabs [data-baseweb="tab"] {
-            font-size: 0.9rem;
-            padding: 0.3rem 0.8rem;
-        }
-    }
-    
-    /* Dark mode support */
-    @media (prefers-color-scheme: dark) {
-        .main {
-            background: linear-gradient(135deg, #1a1a1a 0%, #2d2d2d 100%);
-        }
+        # Get account data
+        try:
+            account = _cached_account()
+            portfolio = _cached_portfolio()
+            
+            if account and portfolio:
+                # Portfolio (securities) market value comes from portfolio profile
+                portfolio_value = _first_float(portfolio, ('market_value', 'equity'))
+                if not portfolio_value:
+                    # The profile can report 0 market value; reuse the cached holdings frame the sections below load anyway
+                    portfolio_value = float(_load_holdings()['value'].sum())
+
+                # Buying power primarily from account; fall back to cash_available_for_withdrawal/portfolio_cash
+                buying_power = _first_float(account, ('buying_power', 'cash_available_for_withdrawal', 'portfolio_cash'))
+
+                # Cash balance from account; fall back appropriately
+                cash_balance = _first_float(account, ('cash', 'portfolio_cash', 'cash_available_for_withdrawal'))
+
+                # Total account value equals equity (includes cash); fall back to sum
+                total_account = _first_float(portfolio, ('equity',), default=None)
+                if total_account is None:
+                    total_account = portfolio_value + cash_balance
+                
+                # Heading and Account Overview Cards, sent as one element (grid layout lives in static/style.css)
+                cards = "".join(
+                    _ACCOUNT_CARD_TEMPLATE.format(
+                        background=background,
+                        label=label,
+                        value=money(value)
+                    )
+                    for label, value, background in (
+                        ("Portfolio Value", portfolio_value, "linear-gradient(135deg, #667eea 0%, #764ba2 100%)"),
+                        ("Buying Power", buying_power, "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)"),
+                        ("Cash Balance", cash_balance, "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)"),
+                        ("Total Account", total_account, "linear-gradient(135deg, #43e97b 0%, #38f9d7 100%)")
+                    )
+                )
+                st.html(f'{_OVERVIEW_HEADER_HTML}<div class="overview-grid">{cards}</div>')
+                
+        except Exception as e:
+            st.error(f"Error loading account overview: {e}")
         
-        .main .block-container {
-            background: #2d2d2d;
-            color: #ffffff;
-            border: 1px solid #444444;
-        }
+        # Portfolio Performance Section
+        st.subheader("📊 Portfolio Performance")
+        st.button("🔄 Refresh prices", key="refresh_prices", on_click=_refresh_holdings)
         
-        .stMetric, .stDataFrame, .stTable, .stMarkdown {
-            background: #2d2d2d;
-            color: #ffffff;
-            border: 1px solid #444444;
-        }
-    }
-    </style>
-    """, unsafe_allow_html=True)
+        try:
+            holdings = _load_holdings()
+            st.session_state['dropped_symbols'] = holdings.attrs.get('dropped', [])
+            if st.session_state['dropped_symbols']:
+                st.warning(f"⚠️ Couldn't load {len(st.session_state['dropped_symbols'])} position(s): "
+                           f"{', '.join(st.session_state['dropped_symbols'])}. Try refreshing prices.")
+            if not holdings.empty:
+                # Calculate portfolio totals
+                total_cost_basis, total_value, total_gain_loss = holdings[['cost', 'value', 'pnl']].sum()
+                
+                # Portfolio summary metrics
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Total Cost Basis", money(total_cost_basis))
+                with col2:
+                    st.metric("Current Value", money(total_value))
+                with col3:
+                    st.metric("Total Gain/Loss", money(total_gain_loss), f"{((total_gain_loss/total_cost_basis)*100):.2f}%" if total_cost_basis > 0 else "0%")
+                with col4:
+                    total_return_pct = ((total_gain_loss/total_cost_basis)*100) if total_cost_basis > 0 else 0
+                    st.metric("Total Return", f"{total_return_pct:.2f}%")
+                
+                # Best and Worst Performers
+                if len(holdings) > 1:
+                    best_performer = holdings.loc[holdings['pnl_pct'].idxmax()]
+                    worst_performer = holdings.loc[holdings['pnl_pct'].idxmin()]
+                    
+                    best_card = _PERFORMER_CARD_TEMPLATE.format(
+                        background="linear-gradient(135deg, #00b894 0%, #00cec9 100%)",
+                        shadow="rgba(0,184,148,0.3)",
+                        title="🏆 Best Performer",
+                        symbol=best_performer['symbol'],
+                        change=f"{best_performer['pnl_pct']:.2f}%"
+                    )
+                    worst_card = _PERFORMER_CARD_TEMPLATE.format(
+                        background="linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%)",
+                        shadow="rgba(255,107,107,0.3)",
+                        title="📉 Worst Performer",
+                        symbol=worst_performer['symbol'],
+                        change=f"{worst_performer['pnl_pct']:.2f}%"
+                    )
+                    st.html(f'<div class="performer-grid">{best_card}{worst_card}</div>')
+            else:
+                st.info("No active positions found in your portfolio.")
+        except Exception as e:
+            st.error(f"Error loading portfolio performance: {e}")
+        
+        # 1. Create allocation pie chart FIRST
+        st.subheader("📈 Portfolio Allocation")
+        
+        # Extract data for pie chart
+        try:
+            holdings = _load_holdings()
+            if not holdings.empty:
+                total_portfolio_value = holdings['value'].sum()
+                
+                # Only include positions > 4% of total portfolio value
+                if total_portfolio_value > 0:
+                    major = holdings[holdings['value'] / total_portfolio_value * 100 > 4]
+                else:
+                    major = holdings.iloc[0:0]
+                symbols = major['symbol'].tolist()
+                values = major['value'].tolist()
+                
+                if symbols and values:
+                    fig_pie = go.Figure(
+                        data=[go.Pie(
+                            labels=symbols,
+                            values=values,
+                            hole=0.3,
+                            textinfo='label+percent',
+                            textposition='outside'
+                        )],
+                        layout=dict(
+                            title='Portfolio Allocation by Value (>4% positions only)',
+                            height=500
+                        )
+                    )
+                    st.plotly_chart(fig_pie, use_container_width=True)
+                    
+                    # Show info about filtered positions
+                    if len(symbols) < len(holdings):
+                        st.info(f"💡 Showing {len(symbols)} positions representing >4% of portfolio value. Smaller positions are hidden for clarity.")
+                else:
+                    st.info("No positions found representing more than 4% of your portfolio.")
+            else:
+                st.info("No active positions found in your portfolio.")
+        except Exception as e:
+            st.error(f"Error loading portfolio data for pie chart: {e}")
+        
+        # 2. Display detailed holdings table SECOND
+        st.subheader("📋 Detailed Holdings")
+        try:
+            holdings = _load_holdings()
+            if not holdings.empty:
+                # Keep numeric dtypes so the table sorts by value; formatting is left to column_config
+                portfolio_data = pd.DataFrame({
+                    'Symbol': holdings['symbol'],
+                    'Quantity': holdings['quantity'],
+                    'Avg Cost': holdings['avg_cost'],
+                    'Current Price': holdings['price'],
+                    'Current Value': holdings['value'],
+                    'Gain/Loss': holdings['pnl'],
+                    'Gain/Loss %': holdings['pnl_pct']
+                })
+                money_column = st.column_config.NumberColumn(format="$%.2f")
+                column_config = {
+                    'Quantity': st.column_config.NumberColumn(format="%.2f"),
+                    'Avg Cost': money_column,
+                    'Current Price': money_column,
+                    'Current Value': money_column,
+                    'Gain/Loss': money_column,
+                    'Gain/Loss %': st.column_config.NumberColumn(format="%.2f%%")
+                }
+                if privacy_mode:
+                    for column in ('Quantity', 'Current Value', 'Gain/Loss'):
+                        portfolio_data[column] = "***"
+                        del column_config[column]
+                
+                # Hand Streamlit an Arrow table so it skips its own pandas conversion
+                st.dataframe(
+                    pa.Table.from_pandas(portfolio_data, preserve_index=False),
+                    hide_index=True,
+                    column_config=column_config,
+                    use_container_width=True
+                )
+            else:
+                st.info("No active positions found in your portfolio.")
+        except Exception as e:
+            st.error(f"Error loading portfolio data for detailed holdings: {e}")
+        
+        # 3. Create performance bar chart THIRD
+        st.subheader("📊 Stock Performance Overview")
+        try:
+            holdings = _load_holdings()
+            if not holdings.empty:
+                gain_loss_pcts = holdings['pnl_pct']
+                
+                # Create bar chart
+                colors = np.where(gain_loss_pcts >= 0, 'green', 'red')
+                fig_bar = go.Figure(
+                    data=[go.Bar(
+                        x=holdings['symbol'],
+                        y=gain_loss_pcts,
+                        marker_color=colors,
+                        text=gain_loss_pcts.map("{:.1f}%".format),
+                        textposition='auto'
+                    )],
+                    layout=dict(
+                        title='Stock Performance Overview',
+                        xaxis_title='Stock Symbol',
+                        yaxis_title='Gain/Loss (%)',
+                        height=500,
+                        showlegend=False
+                    )
+                )
+                
+                st.plotly_chart(fig_bar, use_container_width=True)
+            else:
+                st.info("No active positions found in your portfolio.")
+        except Exception as e:
+            st.error(f"Error loading portfolio data for performance bar chart: {e}")
+        
+    else:
+        st.info("💡 Please log in to Robinhood to view your portfolio analysis.")
+        render_demo_portfolio()
+
+
+@st.fragment
+def _tab_opportunities(analyzer, drop_threshold, investment_amount):
+    """Buy Opportunities tab, rerun on its own when its widgets change"""
+    render_buy_opportunities(analyzer, None, drop_threshold, investment_amount)
+
+
+@st.fragment
+def _tab_research(analyzer):
+    """Stock Research tab, rerun on its own when its widgets change"""
+    render_stock_research(analyzer)
+
+
+def main():
+    """Main Streamlit application"""
+    
+    # Page configuration MUST be called first, before any other Streamlit commands
+    st.set_page_config(
+        page_title=config.PAGE_CONFIG['page_title'],
+        page_icon=config.PAGE_CONFIG['page_icon'],
+        layout=config.PAGE_CONFIG['layout'],
+        initial_sidebar_state="expanded"
+    )
+    
+    # Custom CSS for modern styling
+    _inject_css_once()
     
     # Modern header
-    st.markdown("""
-    <div style="
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 20px;
-        margin-bottom: 2rem;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-        text-align: center;
-        ">
-        <h1 style="
-            color: white;
-            margin: 0;
-            font-size: 3rem;
-            font-weight: 700;
-            text-shadow: 0 2px 4px rgba(0,0,0,0.3);
-        ">🚀 Portfolio Intelligence Pro</h1>
-        <p style="
-            color: rgba(255,255,255,0.9);
-            margin: 0.5rem 0 0 0;
-            font-size: 1.3rem;
-            font-weight: 300;
-        ">Advanced Portfolio Analysis & Trading Intelligence</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_HEADER_HTML, unsafe_allow_html=True)
     
     # Sidebar configuration
     with st.sidebar:
-        st.markdown("""
-        <div style="
-            background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
-            padding: 1.5rem;
-            border-radius: 15px;
-            margin-bottom: 1rem;
-            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-        ">
-            <h3 style="
-                color: white;
-                margin: 0 0 1rem 0;
-                text-align: center;
-                font-weight: 600;
-            ">⚙️ Configuration</h3>
-        """, unsafe_allow_html=True)
-        
-        # Configuration parameters
-        drop_threshold = st.slider(
-            "Market Drop Threshold (%)",
-            min_value=5,
-            max_value=50,
-            value=config.DEFAULT_DROP_THRESHOLD,
-            help="Stocks dropping more than this percentage from their high will be flagged as buy opportunities"
-        )
+        st.markdown(_CONFIG_CARD_HTML, unsafe_allow_html=True)
         
-        investment_amount = st.number_input(
-            "Investment Amount ($)",
-            min_value=100,
-            max_value=100000,
-            value=config.DEFAULT_INVESTMENT_AMOUNT,
-            step=100,
-            help="Amount to invest in each buy opportunity"
-        )
+        # Configuration parameters; batched in a form so the app reruns once on Apply
+        with st.form("sidebar_config", clear_on_submit=False):
+            drop_threshold = st.slider(
+                "Market Drop Threshold (%)",
+                min_value=5,
+                max_value=50,
+                value=config.DEFAULT_DROP_THRESHOLD,
+                help="Stocks dropping more than this percentage from their high will be flagged as buy opportunities"
+            )
+            
+            investment_amount = st.number_input(
+                "Investment Amount ($)",
+                min_value=100,
+                max_value=100000,
+                value=config.DEFAULT_INVESTMENT_AMOUNT,
+                step=100,
+                help="Amount to invest in each buy opportunity"
+            )
+            
+            rsi_window = st.slider(
+                "RSI Window",
+                min_value=5,
+                max_value=30,
+                value=config.DEFAULT_RSI_WINDOW,
+                help="Number of periods for RSI calculation"
+            )
+            
+            stock_period = st.selectbox(
+                "Stock Analysis Period",
+                options=["1mo", "3mo", "6mo", "1y", "2y", "5y"],
+                index=2,
+                help="Time period for stock data analysis"
+            )
+            
+            market_period = st.selectbox(
+                "Market Analysis Period",
+                options=["1mo", "3mo", "6mo", "1y", "2y", "5y"],
+                index=2,
+                help="Time period for market data analysis"
+            )
+            
+            st.form_submit_button("✅ Apply", use_container_width=True)
         
-        rsi_window = st.slider(
-            "RSI Window",
-            min_value=5,
-            max_value=30,
-            value=config.DEFAULT_RSI_WINDOW,
-            help="Number of periods for RSI calculation"
-        )
+        # Robinhood login section
+        st.markdown(_LOGIN_CARD_HTML, unsafe_allow_html=True)
         
-        stock_period = st.selectbox(
-            "Stock Analysis Period",
-            options=["1mo", "3mo", "6mo", "1y", "2y", "5y"],
-            index=2,
-            help="Time period for stock data analysis"
-        )
+        # MFA field with conditional display
+        mfa_required = st.query_params.get("mfa") == "1"
         
-        market_period = st.selectbox(
-            "Market Analysis Period",
-            options=["1mo", "3mo", "6mo", "1y", "2y", "5y"],
-            index=2,
-            help="Time period for market data analysis"
+        # Manual MFA toggle stays outside the form since forms only accept submit buttons
+        st.button(
+            "🔐 MFA",
+            key="toggle_mfa",
+            help="Click if you need to enter MFA code",
+            on_click=_set_mfa_required,
+            args=(not mfa_required,)
         )
         
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Robinhood login section
-        st.markdown("""
-        <div style="
-            background: linear-gradient(135deg, #00b894 0%, #00cec9 100%);
-            padding: 1.5rem;
-            border-radius: 15px;
-            margin-bottom: 1rem;
-            box-shadow: 0 4px 20px rgba(0,184,148,0.3);
-        ">
-            <h3 style="
-                color: white;
-                margin: 0 0 1rem 0;
-                text-align: center;
-                font-weight: 600;
-            ">🔐 Robinhood Login</h3>
-        """, unsafe_allow_html=True)
-        
-        username = st.text_input("Username/Email", key="username", placeholder="Enter your Robinhood username or email")
-        password = st.text_input("Password", type="password", key="password", placeholder="Enter your Robinhood password")
-        
-        # MFA field with conditional display
-        mfa_required = st.session_state.get('mfa_required', False)
+        # Show MFA status
+        if mfa_required:
+            st.info("🔐 MFA Code Required - Please enter your 6-digit authentication code")
         
-        # Add a manual MFA toggle for testing
-        col_mfa1, col_mfa2 = st.columns([3, 1])
-        with col_mfa1:
+        # Batch the credential inputs so typing doesn't rerun the script on every field change
+        with st.form("login_form", clear_on_submit=False):
+            st.text_input("Username/Email", key="username", placeholder="Enter your Robinhood username or email")
+            st.text_input("Password", type="password", key="password", placeholder="Enter your Robinhood password")
             if mfa_required:
-                mfa_code = st.text_input(
+                st.text_input(
                     "MFA Code", 
                     key="mfa_code", 
                     placeholder="Enter your 6-digit MFA code",
                     help="Enter the 6-digit code from your authenticator app or SMS"
                 )
-            else:
-                mfa_code = None
-        
-        with col_mfa2:
-            if st.button("🔐 MFA", key="toggle_mfa", help="Click if you need to enter MFA code"):
-                st.session_state['mfa_required'] = not mfa_required
-                st.rerun()
+            st.form_submit_button("🔑 Login", on_click=_on_login)
         
-        # Show MFA status
-        if mfa_required:
-            st.info("🔐 MFA Code Required - Please enter your 6-digit authentication code")
+        if 'login_future' in st.session_state:
+            _login_status()
         
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🔑 Login", key="login"):
-                if username and password:
-                    try:
-                        # Quick check if already logged in
-                        try:
-                            # Try to get account info to see if already logged in
-                            test_account = rs.load_account_profile()
-                            if test_account:
-                                st.session_state['logged_in'] = True
-                                st.success("✅ Already logged in!")
-                                st.rerun()
-                        except:
-                            pass  # Not logged in, continue with login
-                        
-                        # Show login attempt message with shorter timeout
-                        with st.spinner("🔐 Logging in..."):
-                            # Set a shorter timeout for faster feedback
-                            import time
-                            start_time = time.time()
-                            
-                            try:
-                                # Try direct login without MFA first
-                                if mfa_required and mfa_code:
-                                    # Login with MFA
-                                    rs.login(username, password, mfa_code=mfa_code)
-                                else:
-                                    # Try login without MFA
-                                    rs.login(username, password)
-                                
-                                # If we get here, login was successful
-                                st.session_state['logged_in'] = True
-                                st.session_state['mfa_required'] = False
-                                st.session_state['last_error'] = ""
-                                st.success("✅ Login successful!")
-                                st.rerun()
-                                
-                            except Exception as login_error:
-                                error_msg = str(login_error).lower()
-                                
-                                # Check if MFA is required
-                                if any(keyword in error_msg for keyword in ['mfa', 'two-factor', '2fa', 'verification']):
-                                    st.session_state['mfa_required'] = True
-                                    st.warning("⚠️ MFA code required. Please enter your MFA code above.")
-                                    st.rerun()
-                                elif 'timeout' in error_msg or 'connection' in error_msg:
-                                    st.error("⏱️ Login timeout. Please check your internet connection and try again.")
-                                else:
-                                    # Other login error
-                                    st.error(f"❌ Login failed: {login_error}")
-                                    st.info("💡 Try using your Robinhood app to approve the login if prompted.")
-                                    
-                    except Exception as e:
-                        st.error(f"❌ Login error: {e}")
-                        st.info("💡 If you see device verification prompts, please approve them in your Robinhood app.")
-                else:
-                    st.warning("⚠️ Please enter both username and password.")
+        for kind, message in st.session_state.pop('login_notices', []):
+            getattr(st, kind)(message)
         
-        with col2:
-            if st.button("🚪 Logout", key="logout"):
-                try:
-                    rs.logout()
-                except:
-                    pass  # Ignore logout errors
-                st.session_state['logged_in'] = False
-                st.session_state['mfa_required'] = False
-                st.success("✅ Logged out successfully!")
-                st.rerun()
+        st.button("🚪 Logout", key="logout", on_click=_on_logout)
         
         # MFA help information
         if mfa_required:
-            st.markdown("""
-            <div style="
-                background: rgba(255,255,255,0.1);
-                padding: 1rem;
-                border-radius: 10px;
-                margin-top: 1rem;
-                border-left: 4px solid #ffc107;
-            ">
-                <h4 style="margin: 0 0 0.5rem 0; color: white;">🔐 Multi-Factor Authentication Required</h4>
-                <p style="margin: 0; color: rgba(255,255,255,0.9); font-size: 0.9rem;">
-                    Robinhood requires MFA for security. Enter the 6-digit code from your authenticator app or SMS.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown(_MFA_HELP_HTML, unsafe_allow_html=True)
         
         # Privacy mode section
         privacy_mode = st.session_state.get('privacy_mode', False)
-        st.markdown("""
-        <div style="
-            background: linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%);
-            padding: 1.5rem;
-            border-radius: 15px;
-            margin-bottom: 1rem;
-            box-shadow: 0 4px 20px rgba(255,107,107,0.3);
-        ">
-            <h3 style="
-                color: white;
-                margin: 0 0 1rem 0;
-                text-align: center;
-                font-weight: 600;
-            ">🔒 Privacy Settings</h3>
-        """, unsafe_allow_html=True)
+        st.markdown(_PRIVACY_CARD_HTML, unsafe_allow_html=True)
         
-        privacy_toggle = st.checkbox(
+        st.checkbox(
             "Hide Dollar Amounts", 
             value=privacy_mode,
             help="Hide actual dollar amounts and quantities while keeping growth percentages visible",
-            key="sidebar_privacy_toggle"
+            key="sidebar_privacy_toggle",
+            on_change=_on_privacy_toggle
         )
         
-        if privacy_toggle != privacy_mode:
-            st.session_state['privacy_mode'] = privacy_toggle
-            st.rerun()
-        
-        if privacy_mode:
-            st.markdown("""
-            <div style="
-                background: rgba(255,255,255,0.2);
-                padding: 0.5rem;
-                border-radius: 10px;
-                text-align: center;
-                margin-top: 0.5rem;
-            ">
-                <p style="margin: 0; color: white; font-size: 0.9rem; font-weight: 600;">
-                    🔒 Privacy Mode Active - All values hidden as ***
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown("""
-            <div style="
-                background: rgba(255,255,255,0.2);
-                padding: 0.5rem;
-                border-radius: 10px;
-                text-align: center;
-                margin-top: 0.5rem;
-            ">
-                <p style="margin: 0; color: white; font-size: 0.9rem; font-weight: 600;">
-                    👁️ All Values Visible
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown(_PRIVACY_ON_HTML if privacy_mode else _PRIVACY_OFF_HTML, unsafe_allow_html=True)
     
     # Main content area
     tab1, tab2, tab3, tab4 = st.tabs([
@@ -637,7 +951,7 @@ def main():
     ])
     
     # Initialize components
-    analyzer = StockAnalyzer()
+    analyzer = get_analyzer()
     
     # Check if user is logged in
     is_logged_in = st.session_state.get('logged_in', False)
@@ -646,463 +960,19 @@ def main():
     privacy_mode = st.session_state.get('privacy_mode', False)
     
     with tab1:
-        render_market_overview(analyzer, drop_threshold)
+        _tab_market(analyzer, drop_threshold)
     
     with tab2:
-        if is_logged_in:
-            # Get account data
-            try:
-                account = rs.load_account_profile()
-                portfolio = rs.load_portfolio_profile()
-                
-                if account and portfolio:
-                    # Extract account values using correct sources and safe parsing
-                    def _safe_float(value):
-                        try:
-                            return float(value)
-                        except Exception:
-                            return 0.0
-
-                    # Portfolio (securities) market value comes from portfolio profile
-                    portfolio_value = _safe_float(
-                        (portfolio.get('market_value') if isinstance(portfolio, dict) else 0)
-                        or (portfolio.get('equity') if isinstance(portfolio, dict) else 0)
-                        or 0
-                    )
-
-                    # Buying power primarily from account; fall back to cash_available_for_withdrawal/portfolio_cash
-                    buying_power = _safe_float(
-                        (account.get('buying_power') if isinstance(account, dict) else 0)
-                        or (account.get('cash_available_for_withdrawal') if isinstance(account, dict) else 0)
-                        or (account.get('portfolio_cash') if isinstance(account, dict) else 0)
-                        or 0
-                    )
-
-                    # Cash balance from account; fall back appropriately
-                    cash_balance = _safe_float(
-                        (account.get('cash') if isinstance(account, dict) else 0)
-                        or (account.get('portfolio_cash') if isinstance(account, dict) else 0)
-                        or (account.get('cash_available_for_withdrawal') if isinstance(account, dict) else 0)
-                        or 0
-                    )
-
-                    # Total account value equals equity (includes cash); fall back to sum
-                    total_account = _safe_float(
-                        (portfolio.get('equity') if isinstance(portfolio, dict) else 0)
-                        or (portfolio_value + cash_balance)
-                    )
-                    
-                    st.markdown("""
-                    <div style="margin-bottom: 2rem;">
-                        <h2 style="
-                            color: #2c3e50;
-                            margin: 0 0 1rem 0;
-                            font-weight: 600;
-                            display: flex;
-                            align-items: center;
-                            gap: 0.5rem;
-                        ">
-                            <span style="
-                                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                                -webkit-background-clip: text;
-                                -webkit-text-fill-color: transparent;
-                                background-clip: text;
-                            ">📊</span>
-                            Account Overview
-                        </h2>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Account Overview Cards
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    with col1:
-                        st.markdown(f"""
-                        <div style="
-                            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                            padding: 1.5rem;
-                            border-radius: 15px;
-                            text-align: center;
-                            color: white;
-                            box-shadow: 0 4px 20px rgba(102,126,234,0.3);
-                            margin-bottom: 1rem;
-                        ">
-                            <h4 style="margin: 0 0 0.5rem 0; font-size: 0.9rem; opacity: 0.9;">Portfolio Value</h4>
-                            <h3 style="margin: 0; font-size: 1.8rem; font-weight: bold;">{"***" if privacy_mode else f"${portfolio_value:,.0f}"}</h3>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown(f"""
-                        <div style="
-                            background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-                            padding: 1.5rem;
-                            border-radius: 15px;
-                            text-align: center;
-                            color: white;
-                            box-shadow: 0 4px 20px rgba(240,147,251,0.3);
-                            margin-bottom: 1rem;
-                        ">
-                            <h4 style="margin: 0 0 0.5rem 0; font-size: 0.9rem; opacity: 0.9;">Buying Power</h4>
-                            <h3 style="margin: 0; font-size: 1.8rem; font-weight: bold;">{"***" if privacy_mode else f"${buying_power:,.0f}"}</h3>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col3:
-                        st.markdown(f"""
-                        <div style="
-                            background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-                            padding: 1.5rem;
-                            border-radius: 15px;
-                            text-align: center;
-                            color: white;
-                            box-shadow: 0 4px 20px rgba(79,172,254,0.3);
-                            margin-bottom: 1rem;
-                        ">
-                            <h4 style="margin: 0 0 0.5rem 0; font-size: 0.9rem; opacity: 0.9;">Cash Balance</h4>
-                            <h3 style="margin: 0; font-size: 1.8rem; font-weight: bold;">{"***" if privacy_mode else f"${cash_balance:,.0f}"}</h3>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col4:
-                        st.markdown(f"""
-                        <div style="
-                            background: linear-gradient(135deg, #43e97b 0%, #38f9d7 100%);
-                            padding: 1.5rem;
-                            border-radius: 15px;
-                            text-align: center;
-                            color: white;
-                            box-shadow: 0 4px 20px rgba(67,233,123,0.3);
-                            margin-bottom: 1rem;
-                        ">
-                            <h4 style="margin: 0 0 0.5rem 0; font-size: 0.9rem; opacity: 0.9;">Total Account</h4>
-                            <h3 style="margin: 0; font-size: 1.8rem; font-weight: bold;">{"***" if privacy_mode else f"${total_account:,.0f}"}</h3>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-            except Exception as e:
-                st.error(f"Error loading account overview: {e}")
-            
-            # Portfolio Performance Section
-            st.subheader("📊 Portfolio Performance")
-            
-            try:
-                positions = rs.get_open_stock_positions()
-                if positions:
-                    # Calculate portfolio totals
-                    total_value = 0
-                    total_cost_basis = 0
-                    total_gain_loss = 0
-                    portfolio_data = []
-                    
-                    for position in positions:
-                        if position and float(position['quantity']) > 0:
-                            try:
-                                # Get instrument details
-                                instrument = rs.get_instrument_by_url(position['instrument'])
-                                if instrument:
-                                    symbol = instrument['symbol']
-                                    quantity = float(position['quantity'])
-                                    avg_cost = float(position['average_buy_price'])
-                                    
-                                    # Get current price
-                                    price_data = rs.get_latest_price(symbol)
-                                    if price_data:
-                                        current_price = float(price_data[0])
-                                        
-                                        current_value = quantity * current_price
-                                        cost_basis = quantity * avg_cost
-                                        gain_loss = current_value - cost_basis
-                                        gain_loss_pct = (gain_loss / cost_basis) * 100 if cost_basis > 0 else 0
-                                        
-                                        portfolio_data.append({
-                                            'Symbol': symbol,
-                                            'Quantity': "***" if privacy_mode else f"{quantity:.2f}",
-                                            'Avg Cost': "***" if privacy_mode else f"${avg_cost:.2f}",
-                                            'Current Price': "***" if privacy_mode else f"${current_price:.2f}",
-                                            'Current Value': "***" if privacy_mode else f"${current_value:.2f}",
-                                            'Gain/Loss': "***" if privacy_mode else f"${gain_loss:.2f}",
-                                            'Gain/Loss %': f"{gain_loss_pct:.2f}%"
-                                        })
-                                        
-                                        # Update totals
-                                        total_value += current_value
-                                        total_cost_basis += cost_basis
-                                        total_gain_loss += gain_loss
-                            except Exception as e:
-                                continue
-                    
-                    if portfolio_data:
-                        # Portfolio summary metrics
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("Total Cost Basis", "***" if privacy_mode else f"${total_cost_basis:,.0f}")
-                        with col2:
-                            st.metric("Current Value", "***" if privacy_mode else f"${total_value:,.0f}")
-                        with col3:
-                            st.metric("Total Gain/Loss", "***" if privacy_mode else f"${total_gain_loss:,.0f}", f"{((total_gain_loss/total_cost_basis)*100):.2f}%" if total_cost_basis > 0 else "0%")
-                        with col4:
-                            total_return_pct = ((total_gain_loss/total_cost_basis)*100) if total_cost_basis > 0 else 0
-                            st.metric("Total Return", f"{total_return_pct:.2f}%")
-                        
-                        # Best and Worst Performers
-                        if len(portfolio_data) > 1:
-                            # Sort by gain/loss percentage
-                            sorted_data = sorted(portfolio_data, key=lambda x: float(x['Gain/Loss %'].replace('%', '')), reverse=True)
-                            best_performer = sorted_data[0]
-                            worst_performer = sorted_data[-1]
-                            
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.markdown("""
-                                <div style="
-                                    background: linear-gradient(135deg, #00b894 0%, #00cec9 100%);
-                                    padding: 1.5rem;
-                                    border-radius: 15px;
-                                    text-align: center;
-                                    color: white;
-                                    box-shadow: 0 4px 20px rgba(0,184,148,0.3);
-                                ">
-                                    <h4 style="margin: 0 0 0.5rem 0;">🏆 Best Performer</h4>
-                                    <h3 style="margin: 0.5rem 0;">{}</h3>
-                                    <p style="margin: 0; font-size: 1.2rem; font-weight: bold;">{}</p>
-                                </div>
-                                """.format(best_performer['Symbol'], best_performer['Gain/Loss %']), unsafe_allow_html=True)
-                            
-                            with col2:
-                                st.markdown("""
-                                <div style="
-                                    background: linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%);
-                                    padding: 1.5rem;
-                                    border-radius: 15px;
-                                    text-align: center;
-                                    color: white;
-                                    box-shadow: 0 4px 20px rgba(255,107,107,0.3);
-                                ">
-                                    <h4 style="margin: 0 0 0.5rem 0;">📉 Worst Performer</h4>
-                                    <h3 style="margin: 0.5rem 0;">{}</h3>
-                                    <p style="margin: 0; font-size: 1.2rem; font-weight: bold;">{}</p>
-                                </div>
-                                """.format(worst_performer['Symbol'], worst_performer['Gain/Loss %']), unsafe_allow_html=True)
-                    else:
-                        st.info("No active positions found in your portfolio.")
-                        
-            except Exception as e:
-                st.error(f"Error loading portfolio performance: {e}")
-            
-            # 1. Create allocation pie chart FIRST
-            st.subheader("📈 Portfolio Allocation")
-            
-            # Extract data for pie chart
-            try:
-                positions = rs.get_open_stock_positions()
-                if positions:
-                    symbols = []
-                    values = []
-                    total_portfolio_value = 0
-                    
-                    # First pass: calculate total portfolio value
-                    for position in positions:
-                        if position and float(position['quantity']) > 0:
-                            try:
-                                instrument = rs.get_instrument_by_url(position['instrument'])
-                                if instrument:
-                                    symbol = instrument['symbol']
-                                    quantity = float(position['quantity'])
-                                    
-                                    # Get current price
-                                    price_data = rs.get_latest_price(symbol)
-                                    if price_data:
-                                        current_price = float(price_data[0])
-                                        current_value = quantity * current_price
-                                        total_portfolio_value += current_value
-                            except Exception as e:
-                                continue
-                    
-                    # Second pass: filter positions > 4% and collect data
-                    for position in positions:
-                        if position and float(position['quantity']) > 0:
-                            try:
-                                instrument = rs.get_instrument_by_url(position['instrument'])
-                                if instrument:
-                                    symbol = instrument['symbol']
-                                    quantity = float(position['quantity'])
-                                    
-                                    # Get current price
-                                    price_data = rs.get_latest_price(symbol)
-                                    if price_data:
-                                        current_price = float(price_data[0])
-                                        current_value = quantity * current_price
-                                        
-                                        # Calculate percentage of total portfolio
-                                        percentage = (current_value / total_portfolio_value * 100) if total_portfolio_value > 0 else 0
-                                        
-                                        # Only include positions > 4%
-                                        if percentage > 4:
-                                            symbols.append(symbol)
-                                            values.append(current_value)
-                            except Exception as e:
-                                continue
-                    
-                    if symbols and values:
-                        fig_pie = go.Figure()
-                        fig_pie.add_trace(go.Pie(
-                            labels=symbols,
-                            values=values,
-                            hole=0.3,
-                            textinfo='label+percent',
-                            textposition='outside'
-                        ))
-                        fig_pie.update_layout(
-                            title='Portfolio Allocation by Value (>4% positions only)',
-                            height=500
-                        )
-                        st.plotly_chart(fig_pie, use_container_width=True)
-                        
-                        # Show info about filtered positions
-                        if len(symbols) < len([p for p in positions if p and float(p['quantity']) > 0]):
-                            st.info(f"💡 Showing {len(symbols)} positions representing >4% of portfolio value. Smaller positions are hidden for clarity.")
-                    else:
-                        st.info("No positions found representing more than 4% of your portfolio.")
-                else:
-                    st.info("No active positions found in your portfolio.")
-            except Exception as e:
-                st.error(f"Error loading portfolio data for pie chart: {e}")
-            
-            # 2. Display detailed holdings table SECOND
-            st.subheader("📋 Detailed Holdings")
-            try:
-                positions = rs.get_open_stock_positions()
-                if positions:
-                    portfolio_data = []
-                    
-                    for position in positions:
-                        if position and float(position['quantity']) > 0:
-                            try:
-                                # Get instrument details
-                                instrument = rs.get_instrument_by_url(position['instrument'])
-                                if instrument:
-                                    symbol = instrument['symbol']
-                                    quantity = float(position['quantity'])
-                                    avg_cost = float(position['average_buy_price'])
-                                    
-                                    # Get current price
-                                    price_data = rs.get_latest_price(symbol)
-                                    if price_data:
-                                        current_price = float(price_data[0])
-                                        current_value = quantity * current_price
-                                        gain_loss = current_value - (quantity * avg_cost)
-                                        gain_loss_pct = (gain_loss / (quantity * avg_cost)) * 100 if avg_cost > 0 else 0
-                                        
-                                        portfolio_data.append({
-                                            'Symbol': symbol,
-                                            'Quantity': "***" if privacy_mode else f"{quantity:.2f}",
-                                            'Avg Cost': f"${avg_cost:.2f}",
-                                            'Current Price': f"${current_price:.2f}",
-                                            'Current Value': "***" if privacy_mode else f"${current_value:.2f}",
-                                            'Gain/Loss': "***" if privacy_mode else f"${gain_loss:.2f}",
-                                            'Gain/Loss %': f"{gain_loss_pct:.2f}%"
-                                        })
-                            except Exception as e:
-                                continue
-                    
-                    if portfolio_data:
-                        df = pd.DataFrame(portfolio_data)
-                        st.dataframe(df, use_container_width=True)
-                    else:
-                        st.info("No active positions found in your portfolio.")
-                else:
-                    st.info("No active positions found in your portfolio.")
-            except Exception as e:
-                st.error(f"Error loading portfolio data for detailed holdings: {e}")
-            
-            # 3. Create performance bar chart THIRD
-            st.subheader("📊 Stock Performance Overview")
-            try:
-                positions = rs.get_open_stock_positions()
-                if positions:
-                    symbols = []
-                    gain_loss_pcts = []
-                    
-                    for position in positions:
-                        if position and float(position['quantity']) > 0:
-                            try:
-                                # Get instrument details
-                                instrument = rs.get_instrument_by_url(position['instrument'])
-                                if instrument:
-                                    symbol = instrument['symbol']
-                                    quantity = float(position['quantity'])
-                                    avg_cost = float(position['average_buy_price'])
-                                    
-                                    # Get current price
-                                    price_data = rs.get_latest_price(symbol)
-                                    if price_data:
-                                        current_price = float(price_data[0])
-                                        gain_loss = (current_price - avg_cost) / avg_cost * 100 if avg_cost > 0 else 0
-                                        
-                                        symbols.append(symbol)
-                                        gain_loss_pcts.append(gain_loss)
-                            except Exception as e:
-                                continue
-                    
-                    if symbols and gain_loss_pcts:
-                        # Create bar chart
-                        fig_bar = go.Figure()
-                        colors = ['green' if x >= 0 else 'red' for x in gain_loss_pcts]
-                        
-                        fig_bar.add_trace(go.Bar(
-                            x=symbols,
-                            y=gain_loss_pcts,
-                            marker_color=colors,
-                            text=[f"{x:.1f}%" for x in gain_loss_pcts],
-                            textposition='auto'
-                        ))
-                        
-                        fig_bar.update_layout(
-                            title='Stock Performance Overview',
-                            xaxis_title='Stock Symbol',
-                            yaxis_title='Gain/Loss (%)',
-                            height=500,
-                            showlegend=False
-                        )
-                        
-                        st.plotly_chart(fig_bar, use_container_width=True)
-                    else:
-                        st.info("No active positions found in your portfolio.")
-                else:
-                    st.info("No active positions found in your portfolio.")
-            except Exception as e:
-                st.error(f"Error loading portfolio data for performance bar chart: {e}")
-            
-        else:
-            st.info("💡 Please log in to Robinhood to view your portfolio analysis.")
-            render_demo_portfolio()
+        _tab_portfolio(is_logged_in, privacy_mode)
     
     with tab3:
-        render_buy_opportunities(analyzer, None, drop_threshold, investment_amount)
+        _tab_opportunities(analyzer, drop_threshold, investment_amount)
     
     with tab4:
-        render_stock_research(analyzer)
+        _tab_research(analyzer)
     
     # Modern footer
-    st.markdown("""
-    <div style="
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1.5rem;
-        border-radius: 15px;
-        text-align: center;
-        margin-top: 2rem;
-        box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-    ">
-        <p style="margin: 0; font-size: 1rem; opacity: 0.9;">
-            🚀 Portfolio Intelligence Pro - Advanced Portfolio Analysis & Trading Intelligence
-        </p>
-        <p style="margin: 0.5rem 0 0 0; font-size: 0.9rem; opacity: 0.8;">
-            Built with Streamlit • Powered by Robinhood API • Modern UI Design
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_FOOTER_HTML, unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
@@ -10,7 +10,7 @@ MARKET_INDICES = {
 }
 
 # Default stocks for analysis
-DEFAULT_STOCKS = ['AAPL', 'GOOGL', 'MSFT', 'TSLA', 'AMZN', 'NVDA', 'META', 'NFLX']
+DEFAULT_STOCKS = ('AAPL', 'GOOGL', 'MSFT', 'TSLA', 'AMZN', 'NVDA', 'META', 'NFLX')
 
 # Streamlit page configuration
 PAGE_CONFIG = {
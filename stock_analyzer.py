@@ -2,45 +2,190 @@
 Stock Analyzer module for fetching and analyzing stock data
 """
 
+import hashlib
+import pickle
+import shutil
+import threading
+import time
 import pandas as pd
 import numpy as np
+import requests
 import yfinance as yf
 import streamlit as st
-from typing import Dict
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
 from config import MARKET_INDICES, DEFAULT_RSI_WINDOW, DEFAULT_STOCK_PERIOD, DEFAULT_MARKET_PERIOD
 
+# Keep yfinance's per-symbol timezone lookups on disk next to the app instead of redoing them
+yf.set_tz_cache_location(str(Path(__file__).parent / ".yf_tz_cache"))
+
+_OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Daily bars are stamped in the exchange's timezone and settle an hour after the 16:00 close
+_EXCHANGE_TZ = "America/New_York"
+_BARS_FINAL_HOUR = 17
+
+# Per-day pickles of completed bars and fundamentals that survive restarts
+_DISK_CACHE_DIR = Path(__file__).parent / ".stock_cache"
+
+# Failures worth retrying: network errors and Yahoo rate limiting; anything else is raised at once
+_TRANSIENT_ERRORS = (requests.RequestException, ConnectionError, TimeoutError)
+try:
+    from yfinance.exceptions import YFRateLimitError
+    _TRANSIENT_ERRORS += (YFRateLimitError,)
+except ImportError:  # older yfinance releases don't have it
+    pass
+try:
+    from curl_cffi.requests.exceptions import RequestException as CurlRequestException
+    _TRANSIENT_ERRORS += (CurlRequestException,)
+except ImportError:  # yfinance releases before curl_cffi use plain requests
+    pass
+
+
+def _history(symbol: str, period: str, attempts: int = 3) -> pd.DataFrame:
+    """Download price history, retrying transient Yahoo failures (429s, timeouts) with backoff"""
+    for attempt in range(attempts):
+        try:
+            # actions=False skips the Dividends/Stock Splits columns nothing here reads
+            return yf.Ticker(symbol).history(period=period, actions=False).reindex(columns=_OHLCV)
+        except _TRANSIENT_ERRORS:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def _closed_cutoff() -> str:
+    """Exchange (New York) date before which every daily bar is final; today's bar only counts once the close has settled"""
+    now = pd.Timestamp.now(tz=_EXCHANGE_TZ)
+    cutoff = now + pd.Timedelta(days=1) if now.hour >= _BARS_FINAL_HOUR else now
+    return cutoff.date().isoformat()
+
+
+def _disk_cached(namespace: str, key: str, as_of: str, fetch: Callable[[], object]):
+    """``fetch()`` memoized on disk for the ``as_of`` day so restarts reuse it; other days' folders are pruned when a new day starts"""
+    day_dir = _DISK_CACHE_DIR / namespace / as_of
+    path = day_dir / f"{hashlib.sha256(key.encode()).hexdigest()[:32]}.pkl"
+    try:
+        with path.open("rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    value = fetch()
+    try:
+        if not day_dir.exists():
+            for stale in day_dir.parent.glob("*"):
+                if stale.name != as_of:
+                    shutil.rmtree(stale, ignore_errors=True)
+            day_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+    except OSError:
+        pass  # The disk layer is best-effort; the in-memory cache above it still has the value
+    return value
+
+
+@st.cache_data(ttl=86400, max_entries=1024, show_spinner=False)
+def _fetch_closed_history(symbol: str, period: str, as_of: str) -> pd.DataFrame:
+    """Bars before ``as_of`` (an exchange date), also kept on disk; completed bars never change, so only the cutoff rolls entries over"""
+    def fetch():
+        data = _history(symbol, period)
+        return data[data.index.date < date.fromisoformat(as_of)]
+    return _disk_cached("closed", f"{symbol}|{period}", as_of, fetch)
+
+
+@st.cache_data(ttl=300, max_entries=256, show_spinner=False)
+def _fetch_history(symbol: str, period: str) -> pd.DataFrame:
+    """Price history, shared across reruns and sessions for 5 minutes.
+
+    Completed bars come from the per-day disk cache; only the last few days are downloaded
+    again and appended, so a restart or refresh doesn't refetch the whole period.
+    """
+    closed = _fetch_closed_history(symbol, period, _closed_cutoff())
+    if closed.empty:
+        return _history(symbol, period)
+    recent = _history(symbol, "5d")
+    return pd.concat([closed, recent[recent.index > closed.index[-1]]])
+
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def _fetch_histories(symbols: Tuple[str, ...], period: str) -> Dict[str, pd.DataFrame]:
+    """Download several symbols' history in one batched request, cached like _fetch_history.
+
+    Tickers that failed come back as all-NaN columns; they are left out so callers fall
+    back to a per-symbol fetch instead of caching an empty frame.
+    """
+    data = yf.download(list(symbols), period=period, group_by='ticker', auto_adjust=True,
+                       threads=True, progress=False)
+    if not isinstance(data.columns, pd.MultiIndex):
+        frames = {symbols[0]: data.dropna(how='all')}
+    else:
+        downloaded = set(data.columns.get_level_values(0))
+        frames = {symbol: data[symbol].dropna(how='all') for symbol in symbols if symbol in downloaded}
+    return {symbol: frame for symbol, frame in frames.items() if not frame.empty}
+
+
+@st.cache_data(ttl=86400, max_entries=2048, show_spinner=False)
+def _fetch_info(symbol: str) -> Dict:
+    """Download fundamentals, kept in the per-day disk cache so restarts skip the slow .info call"""
+    as_of = pd.Timestamp.now(tz=_EXCHANGE_TZ).date().isoformat()
+    return _disk_cached("info", symbol, as_of, lambda: yf.Ticker(symbol).info)
+
 
 class StockAnalyzer:
-    def __init__(self):
+    def __init__(self, notify: Optional[Callable[[str], None]] = None):
+        """``notify`` receives error messages; defaults to st.error, pass e.g. logging.error to run headless"""
         self.market_indices = MARKET_INDICES
+        self._notify = notify or st.error
         
+    @staticmethod
+    def clear_cache():
+        """Drop the in-memory price history caches so the next call refetches; the per-day disk caches of closed bars and fundamentals are kept"""
+        _fetch_history.clear()
+        _fetch_histories.clear()
+    
     def get_stock_data(self, symbol: str, period: str = DEFAULT_STOCK_PERIOD) -> pd.DataFrame:
         """Fetch stock data using yfinance"""
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period=period)
-            return data
+            return _fetch_history(symbol, period)
         except Exception as e:
-            st.error(f"Error fetching data for {symbol}: {e}")
+            self._notify(f"Error fetching data for {symbol}: {e}")
             return pd.DataFrame()
     
-    def calculate_market_drop(self, symbol: str) -> float:
-        """Calculate the percentage drop from recent high"""
-        data = self.get_stock_data(symbol, DEFAULT_MARKET_PERIOD)
+    def get_bulk_history(self, symbols, period: str = DEFAULT_STOCK_PERIOD, chunk_size: int = 20) -> Dict[str, pd.DataFrame]:
+        """Fetch history for several symbols with one yfinance download per chunk of symbols"""
+        symbols = tuple(symbols)
+        history = {}
+        for start in range(0, len(symbols), chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            try:
+                history.update(_fetch_histories(chunk, period))
+            except Exception as e:
+                self._notify(f"Error fetching data for {', '.join(chunk)}: {e}")
+        return history
+    
+    def calculate_market_drop(self, symbol: str, data: Optional[pd.DataFrame] = None) -> float:
+        """Calculate the percentage drop from recent high, reusing a longer history frame if given"""
+        if data is None:
+            data = self.get_stock_data(symbol, DEFAULT_MARKET_PERIOD)
+        else:
+            data = data.iloc[-126:]  # ~6 months of trading days, matching DEFAULT_MARKET_PERIOD
         if data.empty:
             return 0
         
-        recent_high = data['High'].max()
-        current_price = data['Close'].iloc[-1]
+        recent_high = np.nanmax(data['High'].to_numpy())
+        current_price = data['Close'].to_numpy()[-1]
         drop_percentage = ((recent_high - current_price) / recent_high) * 100
         
         return drop_percentage
     
     def calculate_rsi(self, prices: pd.Series, window: int = DEFAULT_RSI_WINDOW) -> float:
-        """Calculate RSI (Relative Strength Index)"""
+        """Calculate RSI (Relative Strength Index) with Wilder's smoothing"""
         delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+        gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+        loss = (-delta.clip(upper=0)).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
         rs = gain / loss
         rsi = 100 - (100 / (1 + rs))
         return rsi.iloc[-1] if not rsi.empty else 50
@@ -107,23 +252,31 @@ class StockAnalyzer:
             'resistance_distance': ((nearest_resistance - current_price) / current_price) * 100
         }
     
-    def get_stock_metrics(self, symbol: str) -> Dict:
-        """Get key stock metrics"""
+    def get_stock_metrics(self, symbol: str, data: Optional[pd.DataFrame] = None) -> Dict:
+        """Get key stock metrics: price-based metrics plus fundamentals"""
+        metrics = self.get_price_metrics(symbol, data)
+        if metrics:
+            metrics.update(self.get_fundamentals(symbol))
+        return metrics
+    
+    def get_price_metrics(self, symbol: str, data: Optional[pd.DataFrame] = None) -> Dict:
+        """Get price history based metrics, optionally from an already downloaded history frame"""
         try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            data = self.get_stock_data(symbol, DEFAULT_STOCK_PERIOD)
+            if data is None:
+                data = self.get_stock_data(symbol, DEFAULT_STOCK_PERIOD)
             
             if data.empty:
                 return {}
             
-            current_price = data['Close'].iloc[-1]
-            year_high = data['High'].max()
-            year_low = data['Low'].min()
+            # Work on the raw arrays; pandas dispatch outweighs the arithmetic on ~252 rows
+            close = data['Close'].to_numpy()
+            current_price = close[-1]
+            year_high = np.nanmax(data['High'].to_numpy())
+            year_low = np.nanmin(data['Low'].to_numpy())
             
             # Calculate volatility (standard deviation of returns)
-            returns = data['Close'].pct_change().dropna()
-            volatility = returns.std() * np.sqrt(252) * 100  # Annualized
+            returns = np.diff(close) / close[:-1]
+            volatility = np.nanstd(returns, ddof=1) * np.sqrt(252) * 100  # Annualized
             
             # Calculate technical indicators
             rsi = self.calculate_rsi(data['Close'])
@@ -138,16 +291,16 @@ class StockAnalyzer:
             ma_200 = data['Close'].rolling(window=200).mean().iloc[-1]
             
             # Calculate price momentum
-            momentum_1m = ((current_price / data['Close'].iloc[-22]) - 1) * 100 if len(data) >= 22 else 0
-            momentum_3m = ((current_price / data['Close'].iloc[-66]) - 1) * 100 if len(data) >= 66 else 0
-            momentum_6m = ((current_price / data['Close'].iloc[-126]) - 1) * 100 if len(data) >= 126 else 0
+            momentum_1m = ((current_price / close[-22]) - 1) * 100 if len(close) >= 22 else 0
+            momentum_3m = ((current_price / close[-66]) - 1) * 100 if len(close) >= 66 else 0
+            momentum_6m = ((current_price / close[-126]) - 1) * 100 if len(close) >= 126 else 0
             
             return {
                 'symbol': symbol,
                 'current_price': current_price,
                 'year_high': year_high,
                 'year_low': year_low,
-                'drop_from_high': self.calculate_market_drop(symbol),
+                'drop_from_high': self.calculate_market_drop(symbol, data),
                 'volatility': volatility,
                 'rsi': rsi,
                 'macd': macd_data,
@@ -163,7 +316,23 @@ class StockAnalyzer:
                     '1m': momentum_1m,
                     '3m': momentum_3m,
                     '6m': momentum_6m
-                },
+                }
+            }
+        except Exception as e:
+            self._notify(f"Error getting metrics for {symbol}: {e}")
+            return {}
+    
+    def get_price_metrics_bulk(self, symbols, period: str = DEFAULT_STOCK_PERIOD) -> Dict[str, Dict]:
+        """Price metrics for several symbols from batched downloads; symbols the batch missed fall back to their own fetch"""
+        symbols = tuple(symbols)
+        history = self.get_bulk_history(symbols, period)
+        return {symbol: self.get_price_metrics(symbol, history.get(symbol)) for symbol in symbols}
+    
+    def get_fundamentals(self, symbol: str) -> Dict:
+        """Get fundamentals from yfinance's (slow) info endpoint"""
+        try:
+            info = _fetch_info(symbol)
+            return {
                 'market_cap': info.get('marketCap', 'N/A'),
                 'pe_ratio': info.get('trailingPE', 'N/A'),
                 'dividend_yield': info.get('dividendYield', 0) * 100 if info.get('dividendYield') else 0,
@@ -176,13 +345,13 @@ class StockAnalyzer:
                 'profit_margins': info.get('profitMargins', 'N/A')
             }
         except Exception as e:
-            st.error(f"Error getting metrics for {symbol}: {e}")
+            self._notify(f"Error getting fundamentals for {symbol}: {e}")
             return {}
     
     def get_trading_signals(self, symbol: str) -> Dict:
         """Generate trading signals based on technical analysis"""
         try:
-            metrics = self.get_stock_metrics(symbol)
+            metrics = self.get_price_metrics(symbol)
             if not metrics:
                 return {}
             
@@ -286,7 +455,7 @@ class StockAnalyzer:
             }
             
         except Exception as e:
-            st.error(f"Error generating trading signals for {symbol}: {e}")
+            self._notify(f"Error generating trading signals for {symbol}: {e}")
             return {}
     
     def get_risk_assessment(self, symbol: str) -> Dict:
@@ -352,5 +521,5 @@ class StockAnalyzer:
             }
             
         except Exception as e:
-            st.error(f"Error assessing risk for {symbol}: {e}")
+            self._notify(f"Error assessing risk for {symbol}: {e}")
             return {} 
\ No newline at end of file
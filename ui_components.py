@@ -3,13 +3,13 @@ UI Components module for Streamlit interface elements
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import plotly.graph_objects as go
 import plotly.express as px
-import numpy as np
-from typing import List, Dict
-from config import DEFAULT_STOCKS
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from stock_analyzer import StockAnalyzer
 
 
 def validate_portfolio_data(portfolio):
@@ -43,16 +43,60 @@ def validate_portfolio_data(portfolio):
     return True, "Portfolio data is valid"
 
 
+@st.cache_resource(ttl=300, max_entries=8, show_spinner=False)
+def _market_trend_chart(closes):
+    """Normalized index performance chart, keyed on the closes themselves so fresh data always rebuilds it"""
+    # Normalize to percentage change from start in one array expression
+    values = closes.to_numpy()
+    df_normalized = pd.DataFrame((values / values[0] - 1.0) * 100.0, index=closes.index, columns=closes.columns)
+    
+    fig = px.line(df_normalized, title="Market Performance (% Change)")
+    fig.update_layout(yaxis_title="Percentage Change (%)", xaxis_title="Date")
+    return fig
+
+
+@st.cache_resource(ttl=300, max_entries=32, show_spinner=False)
+def _price_chart(data, symbol, height):
+    """Candlestick chart with 20/50-day moving averages, keyed on the price data so a refresh always rebuilds it"""
+    # Hand plotly NumPy arrays so it doesn't convert each Series to a list
+    dates = data.index.to_numpy()
+    close = data['Close']
+    return go.Figure(
+        data=[
+            go.Candlestick(
+                x=dates,
+                open=data['Open'].to_numpy(),
+                high=data['High'].to_numpy(),
+                low=data['Low'].to_numpy(),
+                close=close.to_numpy(),
+                name='Price'
+            ),
+            go.Scatter(x=dates, y=close.rolling(window=20).mean().to_numpy(), mode='lines',
+                       name='MA 20', line=dict(color='orange', width=1)),
+            go.Scatter(x=dates, y=close.rolling(window=50).mean().to_numpy(), mode='lines',
+                       name='MA 50', line=dict(color='blue', width=1))
+        ],
+        layout=dict(
+            title=f'{symbol} Price Chart',
+            yaxis_title='Price ($)',
+            xaxis_title='Date',
+            xaxis_rangeslider_visible=False,
+            height=height
+        )
+    )
+
+
 def render_market_overview(analyzer, drop_threshold):
     """Render the Market Overview tab"""
     st.header("Market Overview")
     
-    # Market indices analysis
+    # Market indices analysis; all indices come from one batched download
     col1, col2, col3 = st.columns(3)
+    index_metrics = analyzer.get_price_metrics_bulk(analyzer.market_indices.values())
     
     for i, (name, symbol) in enumerate(analyzer.market_indices.items()):
         with [col1, col2, col3][i]:
-            metrics = analyzer.get_stock_metrics(symbol)
+            metrics = index_metrics[symbol]
             if metrics:
                 drop = metrics['drop_from_high']
                 
@@ -77,20 +121,18 @@ def render_market_overview(analyzer, drop_threshold):
     # Market trend chart
     st.subheader("Market Trends (Last 6 Months)")
     
+    # Reuse the year of index history loaded for the cards above instead of downloading 6mo again
+    index_history = analyzer.get_bulk_history(analyzer.market_indices.values())
     market_data = {}
     for name, symbol in analyzer.market_indices.items():
-        data = analyzer.get_stock_data(symbol, "6mo")
-        if not data.empty:
-            market_data[name] = data['Close']
+        data = index_history.get(symbol)
+        if data is not None and not data.empty:
+            close = data['Close']
+            market_data[name] = close[close.index >= close.index[-1] - pd.DateOffset(months=6)]
     
     if market_data:
-        df = pd.DataFrame(market_data)
-        # Normalize to percentage change from start
-        df_normalized = (df / df.iloc[0] - 1) * 100
-        
-        fig = px.line(df_normalized, title="Market Performance (% Change)")
-        fig.update_layout(yaxis_title="Percentage Change (%)", xaxis_title="Date")
-        st.plotly_chart(fig, use_container_width=True)
+        # Align the indices on date; the figure itself is cached on these closes
+        st.plotly_chart(_market_trend_chart(pd.DataFrame(market_data)), use_container_width=True)
 
 
 def render_portfolio_analysis(rh_integration):
@@ -198,46 +240,13 @@ def render_stock_research(analyzer):
                 # Price chart with technical indicators
                 st.subheader("📈 Price Chart & Technical Analysis")
                 
-                # Create candlestick chart
-                fig = go.Figure()
-                
-                fig.add_trace(go.Candlestick(
-                    x=stock_data.index,
-                    open=stock_data['Open'],
-                    high=stock_data['High'],
-                    low=stock_data['Low'],
-                    close=stock_data['Close'],
-                    name='Price'
-                ))
-                
-                # Add moving averages
-                ma_20 = stock_data['Close'].rolling(window=20).mean()
-                ma_50 = stock_data['Close'].rolling(window=50).mean()
-                
-                fig.add_trace(go.Scatter(
-                    x=stock_data.index,
-                    y=ma_20,
-                    mode='lines',
-                    name='MA 20',
-                    line=dict(color='orange', width=1)
-                ))
-                
-                fig.add_trace(go.Scatter(
-                    x=stock_data.index,
-                    y=ma_50,
-                    mode='lines',
-                    name='MA 50',
-                    line=dict(color='blue', width=1)
-                ))
-                
-                fig.update_layout(
-                    title=f'{stock_symbol} Price Chart',
-                    yaxis_title='Price ($)',
-                    xaxis_title='Date',
-                    height=500
-                )
+                # Candlestick chart is cached on its price data, so reruns skip rebuilding it until the data changes
+                st.plotly_chart(_price_chart(stock_data, stock_symbol, 500), use_container_width=True)
                 
-                st.plotly_chart(fig, use_container_width=True)
+                # Moving averages for the signals below
+                dates = stock_data.index.to_numpy()
+                ma_20 = stock_data['Close'].rolling(window=20).mean().to_numpy()
+                ma_50 = stock_data['Close'].rolling(window=50).mean().to_numpy()
                 
                 # Volume analysis
                 st.subheader("📊 Volume Analysis")
@@ -246,24 +255,17 @@ def render_stock_research(analyzer):
                 
                 with col1:
                     # Volume chart
-                    fig_volume = go.Figure()
-                    fig_volume.add_trace(go.Bar(
-                        x=stock_data.index,
-                        y=stock_data['Volume'],
-                        name='Volume',
-                        marker_color='lightblue'
-                    ))
-                    fig_volume.update_layout(
-                        title='Trading Volume',
-                        yaxis_title='Volume',
-                        height=300
+                    volume = stock_data['Volume'].to_numpy()
+                    fig_volume = go.Figure(
+                        data=[go.Bar(x=dates, y=volume, name='Volume', marker_color='lightblue')],
+                        layout=dict(title='Trading Volume', yaxis_title='Volume', height=300)
                     )
                     st.plotly_chart(fig_volume, use_container_width=True)
                 
                 with col2:
                     # Volume statistics
-                    avg_volume = stock_data['Volume'].mean()
-                    current_volume = stock_data['Volume'].iloc[-1]
+                    avg_volume = np.nanmean(volume)
+                    current_volume = volume[-1]
                     volume_ratio = current_volume / avg_volume
                     
                     st.metric("Average Volume", f"{avg_volume:,.0f}")
@@ -289,14 +291,14 @@ def render_stock_research(analyzer):
                     signals.append(("🔴 RSI Overbought", "Strong Sell", "error"))
                 
                 # Moving average signals
-                if ma_20.iloc[-1] > ma_50.iloc[-1]:
+                if ma_20[-1] > ma_50[-1]:
                     signals.append(("🟢 MA 20 > MA 50", "Bullish", "success"))
                 else:
                     signals.append(("🔴 MA 20 < MA 50", "Bearish", "error"))
                 
                 # Price vs moving averages
                 current_price = stock_data['Close'].iloc[-1]
-                if current_price > ma_20.iloc[-1]:
+                if current_price > ma_20[-1]:
                     signals.append(("🟢 Price > MA 20", "Above Support", "success"))
                 else:
                     signals.append(("🔴 Price < MA 20", "Below Support", "error"))
@@ -365,6 +367,17 @@ def render_demo_portfolio():
     st.info("Demo portfolio functionality coming soon!")
 
 
+def _format_market_cap(market_cap):
+    """Abbreviate a market cap as $T/$B/$M"""
+    if market_cap == 'N/A':
+        return "N/A"
+    if market_cap > 1e12:
+        return f"${market_cap/1e12:.1f}T"
+    if market_cap > 1e9:
+        return f"${market_cap/1e9:.1f}B"
+    return f"${market_cap/1e6:.1f}M"
+
+
 def render_buy_opportunities(analyzer, rh_integration, drop_threshold, investment_amount):
     """Render the Buy Opportunities tab with comprehensive analysis"""
     st.header("🎯 Buy Opportunities & Market Analysis")
@@ -421,11 +434,31 @@ def render_buy_opportunities(analyzer, rh_integration, drop_threshold, investmen
     if st.button("🔍 Scan for Opportunities", type="primary"):
         with st.spinner("Scanning market for buy opportunities..."):
             opportunities = []
+            # Workers report through this list instead of st.error; it is shown from the script thread below
+            errors = []
+            worker_analyzer = StockAnalyzer(notify=errors.append)
             
-            for sector in selected_sectors:
-                for symbol in sectors[sector]:
+            scan = [(sector, symbol) for sector in selected_sectors for symbol in sectors[sector]]
+            
+            # One batched download per chunk of symbols instead of one request per symbol
+            history = analyzer.get_bulk_history(symbol for _, symbol in scan)
+            
+            def _analyze(symbol):
+                # Fundamentals are the slow part, so only fetch them for symbols that clear the drop filter
+                metrics = worker_analyzer.get_price_metrics(symbol, history.get(symbol))
+                if metrics and metrics['drop_from_high'] >= min_drop:
+                    metrics.update(worker_analyzer.get_fundamentals(symbol))
+                return metrics
+            
+            # Fundamentals are still a request per symbol, so analyze symbols concurrently
+            progress = st.progress(0.0)
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                futures = {pool.submit(_analyze, symbol): (sector, symbol) for sector, symbol in scan}
+                for done, future in enumerate(as_completed(futures), 1):
+                    progress.progress(done / len(futures))
+                    sector, symbol = futures[future]
                     try:
-                        metrics = analyzer.get_stock_metrics(symbol)
+                        metrics = future.result()
                         if metrics and metrics.get('current_price', 0) > 0:
                             drop = metrics.get('drop_from_high', 0)
                             pe_ratio = metrics.get('pe_ratio', 999)
@@ -456,48 +489,55 @@ def render_buy_opportunities(analyzer, rh_integration, drop_threshold, investmen
                                     'score': score
                                 })
                     except Exception as e:
-                        continue
+                        errors.append(f"Error analyzing {symbol}: {e}")
+            progress.empty()
+            if errors:
+                st.error("\n\n".join(errors))
             
-            # Sort by opportunity score
-            opportunities.sort(key=lambda x: x['score'], reverse=True)
+            # One frame for the whole result set, sorted by opportunity score in a single vectorized pass
+            opportunities = pd.DataFrame(opportunities)
             
-            if opportunities:
+            if not opportunities.empty:
+                opportunities = opportunities.sort_values('score', ascending=False, ignore_index=True)
                 st.success(f"Found {len(opportunities)} buy opportunities!")
                 
                 # Display opportunities in a table
                 st.subheader("📋 Top Buy Opportunities")
                 
-                # Create DataFrame for display
-                opp_data = []
-                for opp in opportunities[:20]:  # Show top 20
-                    market_cap_str = "N/A"
-                    if opp['market_cap'] != 'N/A':
-                        if opp['market_cap'] > 1e12:
-                            market_cap_str = f"${opp['market_cap']/1e12:.1f}T"
-                        elif opp['market_cap'] > 1e9:
-                            market_cap_str = f"${opp['market_cap']/1e9:.1f}B"
-                        else:
-                            market_cap_str = f"${opp['market_cap']/1e6:.1f}M"
-                    
-                    opp_data.append({
-                        'Symbol': opp['symbol'],
-                        'Sector': opp['sector'],
-                        'Price': f"${opp['current_price']:.2f}",
-                        'Drop %': f"{opp['drop_from_high']:.1f}%",
-                        'P/E': f"{opp['pe_ratio']:.1f}" if opp['pe_ratio'] != 'N/A' else 'N/A',
-                        'Market Cap': market_cap_str,
-                        'RSI': f"{opp['rsi']:.1f}",
-                        'Score': f"{opp['score']:.1f}"
-                    })
-                
-                df_opp = pd.DataFrame(opp_data)
-                st.dataframe(df_opp, use_container_width=True)
+                # Keep numeric dtypes so columns sort by value; formatting is left to column_config
+                top = opportunities.head(20)  # Show top 20
+                opp_data = pd.DataFrame({
+                    'Symbol': top['symbol'],
+                    'Sector': top['sector'],
+                    'Price': top['current_price'],
+                    'Drop %': top['drop_from_high'],
+                    'P/E': pd.to_numeric(top['pe_ratio'], errors='coerce'),  # 'N/A' shows as empty
+                    'Market Cap': top['market_cap'].map(_format_market_cap),
+                    'RSI': top['rsi'],
+                    'Score': top['score']
+                })
+                one_decimal = st.column_config.NumberColumn(format="%.1f")
+                
+                # Hand Streamlit an Arrow table so it skips its own pandas conversion
+                opp_table = pa.Table.from_pandas(opp_data, preserve_index=False)
+                st.dataframe(
+                    opp_table,
+                    hide_index=True,
+                    column_config={
+                        'Price': st.column_config.NumberColumn(format="$%.2f"),
+                        'Drop %': st.column_config.NumberColumn(format="%.1f%%"),
+                        'P/E': one_decimal,
+                        'RSI': one_decimal,
+                        'Score': one_decimal
+                    },
+                    use_container_width=True
+                )
                 
                 # Detailed analysis of top opportunities
                 st.subheader("🔍 Detailed Analysis")
                 
-                if opportunities:
-                    top_opportunity = opportunities[0]
+                if not opportunities.empty:
+                    top_opportunity = opportunities.iloc[0]
                     
                     col1, col2 = st.columns(2)
                     
@@ -529,45 +569,7 @@ def render_buy_opportunities(analyzer, rh_integration, drop_threshold, investmen
                     try:
                         stock_data = analyzer.get_stock_data(top_opportunity['symbol'], "6mo")
                         if not stock_data.empty:
-                            fig = go.Figure()
-                            
-                            fig.add_trace(go.Candlestick(
-                                x=stock_data.index,
-                                open=stock_data['Open'],
-                                high=stock_data['High'],
-                                low=stock_data['Low'],
-                                close=stock_data['Close'],
-                                name='Price'
-                            ))
-                            
-                            # Add moving averages
-                            ma_20 = stock_data['Close'].rolling(window=20).mean()
-                            ma_50 = stock_data['Close'].rolling(window=50).mean()
-                            
-                            fig.add_trace(go.Scatter(
-                                x=stock_data.index,
-                                y=ma_20,
-                                mode='lines',
-                                name='MA 20',
-                                line=dict(color='orange', width=1)
-                            ))
-                            
-                            fig.add_trace(go.Scatter(
-                                x=stock_data.index,
-                                y=ma_50,
-                                mode='lines',
-                                name='MA 50',
-                                line=dict(color='blue', width=1)
-                            ))
-                            
-                            fig.update_layout(
-                                title=f'{top_opportunity["symbol"]} Price Chart',
-                                yaxis_title='Price ($)',
-                                xaxis_title='Date',
-                                height=400
-                            )
-                            
-                            st.plotly_chart(fig, use_container_width=True)
+                            st.plotly_chart(_price_chart(stock_data, top_opportunity['symbol'], 400), use_container_width=True)
                             
                             # Investment recommendation
                             st.subheader("💡 Investment Recommendation")
@@ -605,15 +607,12 @@ def render_buy_opportunities(analyzer, rh_integration, drop_threshold, investmen
                 # Sector breakdown
                 st.subheader("📊 Opportunities by Sector")
                 
-                sector_counts = {}
-                for opp in opportunities:
-                    sector = opp['sector']
-                    sector_counts[sector] = sector_counts.get(sector, 0) + 1
+                sector_counts = opportunities['sector'].value_counts()
                 
-                if sector_counts:
+                if not sector_counts.empty:
                     fig_sector = go.Figure(data=[go.Pie(
-                        labels=list(sector_counts.keys()),
-                        values=list(sector_counts.values()),
+                        labels=sector_counts.index.to_numpy(),
+                        values=sector_counts.to_numpy(),
                         hole=0.3
                     )])
                     fig_sector.update_layout(title="Opportunities by Sector")